@@ -1,6 +1,8 @@
 import os
+import io
+import xml.etree.ElementTree as et
 import numpy as np
-from .utility import util
+from .utility import util,_export_with_scalebar,_auto_length_unit
 from PIL import Image
 from warnings import warn
 
@@ -21,7 +23,7 @@ class helios:
     """
     def __init__(self,filename):
         #raise error if wrong format or file does not exist
-        if type(filename) != str:
+        if not isinstance(filename,str):
             raise TypeError('The argument to the helios class must be a string'
                             ' containing the filename.')
         if not os.path.exists(filename):
@@ -68,8 +70,6 @@ class helios:
             `xml_root.find('<element name>')`.
 
         """
-        import xml.etree.ElementTree as et
-        
         #two possible formats, 'standard' and images from slice and view series
         #try first to get xml from slice and view
         try:
@@ -129,7 +129,7 @@ class helios:
         metadata = self.get_metadata()
         
         if filename is None:
-            filename =  self.filename.rpartition('.')[0]+'_metadata.txt'
+            filename =  os.path.splitext(self.filename)[0]+'_metadata.txt'
         
         with open(filename,'w') as f:
             f.write('original file: '+self.filename+'\n\n')
@@ -194,17 +194,9 @@ class helios:
             )
         
         #find the right unit and rescale for convenience
-        if pixelsize_x >= 0.1:
-            unit = 'm'
-        elif pixelsize_x < 0.1 and pixelsize_x >= 0.1e-3:
-            unit = 'mm'
-            pixelsize_x,pixelsize_y = 1e3*pixelsize_x,1e3*pixelsize_y
-        elif pixelsize_x < 0.1e-3 and pixelsize_x >= 0.1e-6:
-            unit = 'µm'
-            pixelsize_x,pixelsize_y = 1e6*pixelsize_x,1e6*pixelsize_y
-        else:
-            unit = 'nm'
-            pixelsize_x,pixelsize_y = 1e9*pixelsize_x,1e9*pixelsize_y
+        unit,factor = _auto_length_unit(pixelsize_x,min_exp=-1,
+                                        units=('m','mm','µm','nm'))
+        pixelsize_x,pixelsize_y = factor*pixelsize_x,factor*pixelsize_y
         
         pixelsize = (pixelsize_x,pixelsize_y)
         
@@ -226,7 +218,7 @@ class helios:
 
         Parameters
         ----------
-        filename : string or `None`, optional
+        filename : string, path-like or `None`, optional
             Filename + extension to use for the export file. The default is the
             filename sans extension of the original SEM file, with 
             '_exported.png' appended.
@@ -322,6 +314,14 @@ class helios:
         store_settings : bool, optional
             when `True`, a .txt file is saved along with the image containing
             all settings passed to this function. The default is False
+        png_compress_level : int, optional
+            zlib compression level between 0 and 9 used when saving as .png.
+            Lower values save (much) faster at the cost of larger files, use 1
+            for previews or batch exports and 6 to 9 for archiving. The default
+            is 1.
+        optimize : bool, optional
+            whether to let PIL search for the optimal (smallest) encoding when
+            saving, which is slow. The default is False.
         """
         #check if pixelsize already calculated, otherwise call get_pixelsize
         try:
@@ -330,8 +330,9 @@ class helios:
             pixelsize,unit = self.get_pixelsize()
         
         #set default export filename
-        if type(filename) != str:
-            filename = self.filename.rpartition('.')[0]+'_scalebar.png'
+        if not isinstance(filename,(str,os.PathLike)):
+            filename = os.path.splitext(self.filename)[0]+'_scalebar.png'
+        filename = os.fspath(filename)
         
         #check we're not overwriting the original file
         if filename==self.filename:
@@ -340,12 +341,11 @@ class helios:
               
         #get and display image
         try:
-            exportim = self.image.copy()
+            exportim = self.image
         except AttributeError:
-            exportim = self.get_image().copy()
+            exportim = self.get_image()
         
         #call main export_with_scalebar function with correct pixelsize etc
-        from .utility import _export_with_scalebar
         _export_with_scalebar(exportim, pixelsize[0], unit, filename, **kwargs)
 
 
@@ -367,7 +367,7 @@ class phenom:
     """
     def __init__(self,filename):
         #raise error if wrong format or file does not exist
-        if type(filename) != str:
+        if not isinstance(filename,str):
             raise TypeError('The argument to the helios class must be a string'
                             ' containing the filename.')
         if not os.path.exists(filename):
@@ -400,9 +400,6 @@ class phenom:
             argument to print_metadata, or indexed with
             xml_root.find('<element name>')
         """
-        import io
-        import xml.etree.ElementTree as et
-        
         metadata = ''
         read = False
         
@@ -449,7 +446,7 @@ class phenom:
         metadata = self.get_metadata()
         
         if filename is None:
-            filename =  self.filename.rpartition('.')[0]+'_metadata.txt'
+            filename =  os.path.splitext(self.filename)[0]+'_metadata.txt'
         
         with open(filename,'w') as f:
             f.write('original file: '+self.filename+'\n\n')
@@ -531,7 +528,7 @@ class phenom:
 
         Parameters
         ----------
-        filename : string or `None`, optional
+        filename : string, path-like or `None`, optional
             Filename + extension to use for the export file. The default is the
             filename sans extension of the original SEM file, with 
             '_exported.png' appended.
@@ -627,6 +624,14 @@ class phenom:
         store_settings : bool, optional
             when `True`, a .txt file is saved along with the image containing
             all settings passed to this function. The default is False
+        png_compress_level : int, optional
+            zlib compression level between 0 and 9 used when saving as .png.
+            Lower values save (much) faster at the cost of larger files, use 1
+            for previews or batch exports and 6 to 9 for archiving. The default
+            is 1.
+        optimize : bool, optional
+            whether to let PIL search for the optimal (smallest) encoding when
+            saving, which is slow. The default is False.
         """
         #check if pixelsize already calculated, otherwise call get_pixelsize
         try:
@@ -635,8 +640,9 @@ class phenom:
             pixelsize,unit = self.get_pixelsize()
         
         #set default export filename
-        if type(filename) != str:
-            filename = self.filename.rpartition('.')[0]+'_scalebar.png'
+        if not isinstance(filename,(str,os.PathLike)):
+            filename = os.path.splitext(self.filename)[0]+'_scalebar.png'
+        filename = os.fspath(filename)
         
         #check we're not overwriting the original file
         if filename==self.filename:
@@ -645,12 +651,11 @@ class phenom:
               
         #get and display image
         try:
-            exportim = self.image.copy()
+            exportim = self.image
         except AttributeError:
-            exportim = self.get_image().copy()
+            exportim = self.get_image()
         
         #call main export_with_scalebar function with correct pixelsize etc
-        from .utility import _export_with_scalebar
         _export_with_scalebar(exportim, pixelsize[0], unit, filename, **kwargs)
 
 
@@ -669,7 +674,7 @@ class xl30sfeg:
     """
     def __init__(self,filename):
         #raise error if wrong format or file does not exist
-        if type(filename) != str:
+        if not isinstance(filename,str):
             raise TypeError('The argument to the xl30sfeg class must be a '
                             'string containing the filename.')
         if not os.path.exists(filename):
@@ -707,9 +712,6 @@ class xl30sfeg:
             xml_root.find('<element name>')
 
         """
-        import xml.etree.ElementTree as et
-        import io
-        
         metadata = ''
         read = False
          
@@ -787,7 +789,7 @@ class xl30sfeg:
 
         Parameters
         ----------
-        filename : string or `None`, optional
+        filename : string, path-like or `None`, optional
             Filename + extension to use for the export file. The default is the
             filename sans extension of the original SEM file, with 
             '_exported.png' appended.
@@ -883,6 +885,14 @@ class xl30sfeg:
         store_settings : bool, optional
             when `True`, a .txt file is saved along with the image containing
             all settings passed to this function. The default is False
+        png_compress_level : int, optional
+            zlib compression level between 0 and 9 used when saving as .png.
+            Lower values save (much) faster at the cost of larger files, use 1
+            for previews or batch exports and 6 to 9 for archiving. The default
+            is 1.
+        optimize : bool, optional
+            whether to let PIL search for the optimal (smallest) encoding when
+            saving, which is slow. The default is False.
         """
         #check if pixelsize already calculated, otherwise call get_pixelsize
         try:
@@ -891,8 +901,9 @@ class xl30sfeg:
             pixelsize,unit = self.get_pixelsize()
         
         #set default export filename
-        if type(filename) != str:
-            filename = self.filename.rpartition('.')[0]+'_scalebar.png'
+        if not isinstance(filename,(str,os.PathLike)):
+            filename = os.path.splitext(self.filename)[0]+'_scalebar.png'
+        filename = os.fspath(filename)
         
         #check we're not overwriting the original file
         if filename==self.filename:
@@ -901,12 +912,11 @@ class xl30sfeg:
               
         #get and display image
         try:
-            exportim = self.image.copy()
+            exportim = self.image
         except AttributeError:
-            exportim = self.get_image().copy()
+            exportim = self.get_image()
         
         #call main export_with_scalebar function with correct pixelsize etc
-        from .utility import _export_with_scalebar
         _export_with_scalebar(exportim, pixelsize, unit, filename, **kwargs)
 
 
@@ -927,7 +937,7 @@ class ZeissSEM:
     """
     def __init__(self,filename):
         #raise error if wrong format or file does not exist
-        if type(filename) != str:
+        if not isinstance(filename,str):
             raise TypeError('filename must be a string')
         if os.path.exists(filename):
             self.filename = filename
@@ -947,7 +957,7 @@ class ZeissSEM:
         PIL.Image instance
         """
         self.image = np.array(self.PIL_image)
-        self.shape = np.shape(self.image)
+        self.shape = self.image.shape
         return self.image
     
     def get_metadata(self):
@@ -964,7 +974,6 @@ class ZeissSEM:
         metadata = [line for line in metadata if not line[:1].isdigit()]
         
         #construct xml object
-        import xml.etree.ElementTree as et
         xml_root = et.Element('MetaData')
         
         #make sure the first child exists
@@ -1007,7 +1016,7 @@ class ZeissSEM:
         metadata = self.get_metadata()
         
         if filename is None:
-            filename =  self.filename.rpartition('.')[0]+'_metadata.txt'
+            filename =  os.path.splitext(self.filename)[0]+'_metadata.txt'
         
         with open(filename,'w') as f:
             f.write('original file: '+self.filename+'\n\n')
@@ -1068,7 +1077,7 @@ class ZeissSEM:
 
         Parameters
         ----------
-        filename : string or `None`, optional
+        filename : string, path-like or `None`, optional
             Filename + extension to use for the export file. The default is the
             filename sans extension of the original SEM file, with 
             '_exported.png' appended.
@@ -1163,6 +1172,14 @@ class ZeissSEM:
         store_settings : bool, optional
             when `True`, a .txt file is saved along with the image containing
             all settings passed to this function. The default is False
+        png_compress_level : int, optional
+            zlib compression level between 0 and 9 used when saving as .png.
+            Lower values save (much) faster at the cost of larger files, use 1
+            for previews or batch exports and 6 to 9 for archiving. The default
+            is 1.
+        optimize : bool, optional
+            whether to let PIL search for the optimal (smallest) encoding when
+            saving, which is slow. The default is False.
         """
         #check if pixelsize already calculated, otherwise call get_pixelsize
         try:
@@ -1171,8 +1188,9 @@ class ZeissSEM:
             pixelsize,unit = self.get_pixelsize()
         
         #set default export filename
-        if type(filename) != str:
-            filename = self.filename.rpartition('.')[0]+'_scalebar.png'
+        if not isinstance(filename,(str,os.PathLike)):
+            filename = os.path.splitext(self.filename)[0]+'_scalebar.png'
+        filename = os.fspath(filename)
         
         #check we're not overwriting the original file
         if filename==self.filename:
@@ -1181,10 +1199,9 @@ class ZeissSEM:
               
         #get and display image
         try:
-            exportim = self.image.copy()
+            exportim = self.image
         except AttributeError:
-            exportim = self.get_image().copy()
+            exportim = self.get_image()
         
         #call main export_with_scalebar function with correct pixelsize etc
-        from .utility import _export_with_scalebar
         _export_with_scalebar(exportim, pixelsize, unit, filename, **kwargs)
\ No newline at end of file
@@ -1,7 +1,45 @@
 import numpy as np
 import os
+import re
+import xml.etree.ElementTree as et
+from glob import glob
+from struct import unpack
+from tempfile import TemporaryDirectory
+from functools import cached_property
 from PIL import Image
 from warnings import warn,filterwarnings
+from .utility import _export_with_scalebar,_convert_length,_auto_length_unit,\
+    _tesseract_config
+
+#use faster orjson for parsing velox metadata when available
+try:
+    import orjson as json
+except ImportError:
+    import json
+
+#numpy data types of the pixel values for greyscale PIL image modes
+_PIL_MODE_DTYPES = {
+    'L' : np.uint8,
+    'I;16' : '<u2',
+    'I;16B' : '>u2',
+    'I' : np.int32,
+    'F' : np.float32,
+}
+
+#length in meter of the tiff resolution units (2: inch, 3: cm), pixel sizes
+#are stored as pixels per unit
+_TIFF_RESOLUTION_UNITS = {2:2.54e-2, 3:1e-2}
+
+#structuring element for eroding the scale bar text in legacy calibration
+_ERODE_KERNEL = np.ones((5,5),np.uint8)
+
+#precompiled patterns for the value and unit in OCR'd scale bar text
+_BAR_VALUE_RE = re.compile(r'\d+')
+_BAR_UNIT_RE = re.compile(r'[a-z]+')
+
+#maximum size in bytes of the block of frames held while iterating over a
+#velox image, equal to the default chunk cache of the `velox` class
+_ITER_BLOCK_NBYTES = 64*1024**2
 
 class tia:
     """
@@ -23,9 +61,11 @@ class tia:
         name of the image file
     image : np.ndarray
         array of pixel values of the image with the optional data/scale bar 
-        cropped off
+        cropped off. This is a read-only view on the pixel data of the file,
+        use `image.copy()` to obtain an array that can be modified.
     scalebar : numpy.ndarray
-        if present, the array of pixel values of the original data/scale bar
+        if present, the (read-only) array of pixel values of the original 
+        data/scale bar
     shape : tuple
         shape in (y,x) pixels of the image array
     dtype : numpy.dtype
@@ -40,24 +80,58 @@ class tia:
     
     def __init__(self,filename):
         #raise error if wrong format or file does not exist
-        if type(filename) != str:
+        if not isinstance(filename,str):
             raise TypeError('`filename` must be of type `str`')
-        if not os.path.exists(filename):
-            if os.path.exists(filename + '.tif'):
-                filename = filename + '.tif'
-            else:
-                raise FileNotFoundError(f'The file "{filename}" could not be'
-                                        ' found.')
         
-        self.filename = filename
+        #open the image (or with .tif appended) directly rather than checking
+        #existence first. This only reads the tiff tags so that metadata and 
+        #pixel size are available without decoding the pixel values, which is
+        #done on first access of `image` or `scalebar`
+        for fname in (filename,filename+'.tif'):
+            try:
+                self.PIL_image = Image.open(fname)
+                break
+            except FileNotFoundError:
+                pass
+        else:
+            raise FileNotFoundError(f'The file "{filename}" could not be'
+                                    ' found.')
         
-        #load the image
-        self.PIL_image = Image.open(filename)
-        im = np.array(self.PIL_image)
-        self.shape = np.shape(im)
-        self.image = im[:self.shape[1]]
-        self.scalebar = im[self.shape[1]:]
-        self.dtype = self.image.dtype
+        self.filename = fname
+        self.shape = self.PIL_image.size[::-1]
+    
+    @cached_property
+    def _pixels(self):
+        """decoded pixel values of the full image including the data bar"""
+        #asarray wraps the decoded bytes from PIL without copying them again,
+        #which gives a read-only array
+        return np.asarray(self.PIL_image)
+    
+    @cached_property
+    def image(self):
+        """array of pixel values of the image with the data bar cropped off"""
+        #TIA images are square with the data bar appended below, so the image
+        #ends at the row equal to the width. Slicing gives a view, no copy.
+        return self._pixels[:self.shape[1]]
+    
+    @cached_property
+    def scalebar(self):
+        """array of pixel values of the original data/scale bar"""
+        #when the full image array is not needed (yet), crop the bar in PIL
+        #and only convert those rows to an array
+        if not '_pixels' in self.__dict__ and self.shape[0] > self.shape[1]:
+            return np.asarray(self.PIL_image.crop(
+                (0,self.shape[1],self.shape[1],self.shape[0])
+            ))
+        return self._pixels[self.shape[1]:]
+    
+    @cached_property
+    def dtype(self):
+        """data type of the pixel values, taken from the PIL image mode"""
+        try:
+            return np.dtype(_PIL_MODE_DTYPES[self.PIL_image.mode])
+        except KeyError:
+            return self.image.dtype
     
     def get_metadata(self,asdict=False):
         """
@@ -76,24 +150,26 @@ class tia:
             xml_root.find('<element name>')
 
         """
-        #try to get metadata tag, raise warning if not found
-        try:
-            metadata = self.PIL_image.tag[34682][0]
-        except KeyError:
-            warn('no metadata found')
-            return None
+        #parse xml tree from the metadata tag only once, also when converting 
+        #to dictionary. Raise warning if not found
+        if not hasattr(self,'_metadata_xml'):
+            try:
+                metadata = self.PIL_image.tag_v2[34682]
+            except KeyError:
+                warn('no metadata found')
+                return None
+            self._metadata_xml = et.fromstring(metadata)
         
         if asdict:
-            import re
-            
-            #convert to dictionary
-            metadatadict = {}
-            for item in re.findall(r'<Data>(.*?)</Data>',metadata):
-                label = re.findall(r'<Label>(.*?)</Label>',item)[0]
-                unit = re.findall(r'<Unit>(.*?)</Unit>',item)[0]
-                value = re.findall(r'<Value>(.*?)</Value>',item)[0]
-                
-                metadatadict[label] = {"value":value,"unit":unit}
+            #convert to dictionary only once (fields reversed so the first 
+            #occurrence of a field within an item is kept)
+            if not hasattr(self,'_metadata_dict'):
+                self._metadata_dict = {}
+                for item in self._metadata_xml.iter('Data'):
+                    fields = {c.tag:c.text or '' for c in reversed(item)}
+                    self._metadata_dict[fields['Label']] = {
+                        "value":fields['Value'],"unit":fields['Unit']}
+            metadatadict = self._metadata_dict.copy()
             
             #add pixelsize if already known for this class instance
             try:
@@ -106,8 +182,7 @@ class tia:
             self.metadata = metadatadict
             
         else:
-            import xml.etree.ElementTree as et
-            self.metadata = et.fromstring(metadata)
+            self.metadata = self._metadata_xml
         
         return self.metadata
     
@@ -123,15 +198,18 @@ class tia:
         #get max depth
         l = max(len(i) for i in metadata)
         
-        #print header, contents and footer
-        print('\n-----------------------------------------------------')
-        print('METADATA')
-        print(self.filename)
-        print('-----------------------------------------------------')
+        #print header, contents and footer in a single call
+        lines = [
+            '\n-----------------------------------------------------',
+            'METADATA',
+            self.filename,
+            '-----------------------------------------------------',
+        ]
         for i,k in metadata.items():
             string = i+':\t'+str(k['value'])+' '+str(k['unit'])
-            print(string.expandtabs(l+2))
-        print('-----------------------------------------------------\n')
+            lines.append(string.expandtabs(l+2))
+        lines.append('-----------------------------------------------------\n')
+        print('\n'.join(lines))
             
     def export_metadata(self,filename=None):
         """
@@ -175,89 +253,68 @@ class tia:
         """
         #tiff tags 65450 to 65452 give the x resolution, y resolution and unit
         #similar to how tiff tags 2822, 283 and 296 are defined in the tiff 
-        #specification. Specifically, a two-tuple of ints giving pixels per `n` 
+        #specification. Specifically, a rational number giving pixels per `n` 
         #resolution units, e.g. 586350674 pixels per 100 resolution units is 
-        #encoded as (586350674, 100) and gives 1.7 nm/pixel. Tag 65452 gives 
-        #the unit and is 1 for no unit, 2 for inch and 3 for cm
-        if all([t in self.PIL_image.tag for t in [65450,65451,65452]]):
-            pixelsize_x = self.PIL_image.tag[65450][0]
-            pixelsize_y = self.PIL_image.tag[65451][0]
-            baseunit = self.PIL_image.tag[65452][0]
+        #encoded as 586350674/100 and gives 1.7 nm/pixel. Tag 65452 gives the 
+        #unit and is 1 for no unit, 2 for inch and 3 for cm. Tags are read via
+        #`tag_v2` which gives the values directly rather than as tuples
+        tags = self.PIL_image.tag_v2
+        if all([t in tags for t in [65450,65451,65452]]):
+            pixelsize_x = tags[65450]
+            pixelsize_y = tags[65451]
+            baseunit = tags[65452]
         
         #old tecnai 10 uses different software requiring different class (sis)
-        elif 33560 in self.PIL_image.tag:
+        elif 33560 in tags:
             raise KeyError('pixel size not encoded in file but your image '
                            'looks like an Olympus SIS tiff. Did you mean to '
                            'use the `sis` class for e.g. the tecnai 10?')
         
         #check for ImageJ metadata format, as ImageJ overwrites metadata
-        elif 270 in self.PIL_image.tag and 'ImageJ' in self.PIL_image.tag[270][0]:
+        elif 270 in tags and 'ImageJ' in tags[270]:
             warn('it looks like the image was modified in ImageJ, metadata may'
                  ' not be correct',stacklevel=2)
-            from .utility import _convert_length
-            pixelsize_x = self.PIL_image.tag[282][0]
-            pixelsize_y = self.PIL_image.tag[283][0]
-            unit = self.PIL_image.tag[270][0].split('unit=')[1].split('\n')[0]
+            unit = tags[270].split('unit=')[1].split('\n')[0]
             if '\\u00B5' in unit:#replace micro character
                 unit = unit.replace('\\u00B5','µ')
             fact = _convert_length(1, unit, 'cm')[0]#convert baseunit to px/cm
-            pixelsize_x = (pixelsize_x[0],pixelsize_x[1]*fact)
-            pixelsize_y = (pixelsize_y[0],pixelsize_y[1]*fact)
+            pixelsize_x = tags[282]/fact
+            pixelsize_y = tags[283]/fact
             baseunit = 3
             
         #old tecnai 12 images have it in the standard keys 282 and 283 instead
-        elif all([t in self.PIL_image.tag for t in [282,283,296]]):
+        elif all([t in tags for t in [282,283,296]]):
             warn('pixel size metadata in unusual format, value may be '
                  'incorrect',stacklevel=2)
-            pixelsize_x = self.PIL_image.tag[282][0]
-            pixelsize_y = self.PIL_image.tag[283][0]
-            baseunit = self.PIL_image.tag[296][0]
+            pixelsize_x = tags[282]
+            pixelsize_y = tags[283]
+            baseunit = tags[296]
             
         #otherwise set the baseunit to 1 for 'no unit' to fall back to legacy
         else:
             baseunit = 1
 
         #check unit encoding and convert pixels per n baseunit to meter/pixel
-        if baseunit==2:#pixels per inch
-            pixelsize_x = 2.54e-2*pixelsize_x[1]/pixelsize_x[0]
-            pixelsize_y = 2.54e-2*pixelsize_y[1]/pixelsize_y[0]
-        elif baseunit==3:#pixels per cm
-            pixelsize_x = 1e-2*pixelsize_x[1]/pixelsize_x[0]
-            pixelsize_y = 1e-2*pixelsize_y[1]/pixelsize_y[0]
+        if baseunit in _TIFF_RESOLUTION_UNITS:
+            pixelsize_x = _TIFF_RESOLUTION_UNITS[baseunit]/float(pixelsize_x)
+            pixelsize_y = _TIFF_RESOLUTION_UNITS[baseunit]/float(pixelsize_y)
         else:#try and fall back to legacy calibration by reading the scale bar
             warn('unknown pixel size or unit, falling back to '
                  'tia.get_pixelsize_legacy()',stacklevel=2)
-            from .utility import _convert_length
             pixelsize_x,unit = self.get_pixelsize_legacy()
-            baseunit = 3
-            pixelsize_x = [1/_convert_length(pixelsize_x,unit,'cm')[0],1]
+            pixelsize_x = _convert_length(pixelsize_x,unit,'m')[0]
             pixelsize_y = pixelsize_x
         
         #find the right unit and rescale for convenience
         if convert is None:
-            if pixelsize_x >= 1e-3:
-                unit = 'm'
-            elif pixelsize_x < 1e-3 and pixelsize_x >= 1e-6:
-                unit = 'mm'
-                pixelsize_x = 1e3*pixelsize_x
-                pixelsize_y = 1e3*pixelsize_y
-            elif pixelsize_x < 1e-6 and pixelsize_x >= 1e-9:
-                unit = 'µm'
-                pixelsize_x = 1e6*pixelsize_x
-                pixelsize_y = 1e6*pixelsize_y
-            elif pixelsize_x < 1e-9 and pixelsize_x >= 1e-12:
-                unit = 'nm'
-                pixelsize_x = 1e9*pixelsize_x
-                pixelsize_y = 1e9*pixelsize_y
-            else:
-                unit = 'pm'
-                pixelsize_x = 1e12*pixelsize_x
-                pixelsize_y = 1e12*pixelsize_y
+            unit,factor = _auto_length_unit(pixelsize_x)
+            pixelsize_x = factor*pixelsize_x
+            pixelsize_y = factor*pixelsize_y
         #else use given unit
         else:
-            from .utility import _convert_length
-            pixelsize_x,unit = _convert_length(pixelsize_x, 'm', convert)
-            pixelsize_y,unit = _convert_length(pixelsize_y, 'm', convert)
+            factor,unit = _convert_length(1.0, 'm', convert)
+            pixelsize_x = factor*pixelsize_x
+            pixelsize_y = factor*pixelsize_y
             
         #store and return
         if pixelsize_x != pixelsize_y:
@@ -302,11 +359,11 @@ class tia:
             the pixelsize in calibrated (physical) units
         unit : string
             the physical unit of the pixelsize
-
-        """
-        import re
-        import cv2
         
+        See also
+        --------
+        `tia.batch_get_pixelsize`
+        """
         #this is even more redundant where you have to give the pixelsize
         if len(self.scalebar) == 0:
             warn('original scale bar not found!')
@@ -314,26 +371,9 @@ class tia:
             self.unit = 'nm'
             self.pixelsize = pixelsize
             return pixelsize,'nm'
-        #find contour corners of objects sorted left to right, first item in 
-        #corners is scale bar, rest is from text
-        else:
-            sb = self.scalebar
-            if self.dtype != np.uint8:
-                sb = ((sb-sb.min())/((sb.max()-sb.min())/255)).astype(np.uint8)
-            if int(cv2.__version__[0]) >= 4:
-                corners,_ = cv2.findContours(sb,cv2.RETR_LIST,
-                                             cv2.CHAIN_APPROX_SIMPLE)
-            else:
-                _,corners,_ = cv2.findContours(sb,cv2.RETR_LIST,
-                                               cv2.CHAIN_APPROX_SIMPLE)
-            corners = sorted(corners, key=lambda c: cv2.boundingRect(c)[0])
-        
-        #length in pixels between top left corners of vertical bars
-        if use_legacy_measurement:
-            usecorners = [0,10]
-        else:
-            usecorners = [0,9]
-        barlength = corners[0][usecorners[1],0,0]-corners[0][usecorners[0],0,0]
+        #find scale bar corners and length
+        corners,usecorners,barlength = self._measure_scalebar(
+            use_legacy_measurement)
         
         if debug:
             import matplotlib.pyplot as plt
@@ -348,65 +388,17 @@ class tia:
             plt.legend()
             plt.show(block=False)
         
-        #take the text of the databar
-        bartext = self.scalebar[:,
-            min(corners[1][:,0,0])-int(6*self.shape[1]/1024):\
-                max(corners[-1][:,0,0])+int(6*self.shape[1]/1024+1)
-        ]
-        bartext = bartext.max() - bartext
-        
-        #upscale if needed for OCR
-        if self.shape[1] < 4096:
-            if self.shape[1] < 2048:
-                factor = 4
-            else:
-                factor = 2
-            bartextshape = np.shape(bartext)
-            bartext = cv2.resize(
-                bartext,
-                (factor*bartextshape[1],factor*bartextshape[0]),
-                interpolation = cv2.INTER_CUBIC
-            )
-            bartext = cv2.erode(
-                cv2.threshold(bartext,0,255,
-                              cv2.THRESH_BINARY+cv2.THRESH_OTSU)[1],
-                np.ones((5,5),np.uint8)
-            )
-            if debug:
-                print('- preprocessing text, resizing text image from',
-                      bartextshape,'to',np.shape(bartext))
-        
         try:
-            #load tesseract-OCR for reading the text
+            #load tesseract-OCR for reading the text, settings vary per 
+            #version. Done first such that the text is only preprocessed when
+            #tesseract is available
             import pytesseract
+            config = _tesseract_config()
             
-            #switch error handling from a ValueError (we may also raise later
-            #in case of text recognition problems) to one we can only raise 
-            #here, so we can give the correct warning
-            try:
-                tesseract_version = float(str(
-                    pytesseract.get_tesseract_version())[:3])
-            except ValueError:
-                raise FileNotFoundError
+            #take the text of the databar and preprocess for OCR
+            bartext = self._prep_bartext(corners,debug=debug)
             
-            #settings vary per version, so use tesseract_verion to use correct
-            if tesseract_version <= 4.0:
-                text = pytesseract.image_to_string(
-                    bartext,
-                    config="--oem 0 -c tessedit_char_whitelist=0123456789pnuµm --psm 7"
-                )
-                #oem 0 selects older version of tesseract which still takes 
-                #the char_whitelist param
-                #tessedit_char_whitelist takes list of characters it searches 
-                #for (to reduce reading errors)
-                #psm 7 is a mode that tells tesseract to assume a single line 
-                #of text in the image
-            else:
-                text = pytesseract.image_to_string(
-                    bartext,
-                    config="-c tessedit_char_whitelist=0123456789pnuµm --psm 7"
-                )
-                #since version 4.1 char whitelist is added back
+            text = pytesseract.image_to_string(bartext,config=config)
             
             text = text.replace('\x0c','')
             if debug:
@@ -416,8 +408,8 @@ class tia:
                 print('- text:',text)
                 
             #split value and unit
-            value = float(re.findall(r'\d+',text)[0])
-            unit = re.findall(r'[a-z]+',text)[0]
+            value = float(_BAR_VALUE_RE.search(text).group())
+            unit = _BAR_UNIT_RE.search(text).group()
         
         #give different warnings for missing installation or reading problems
         except ImportError:
@@ -456,7 +448,167 @@ class tia:
 
         
         return pixelsize,unit
+    
+    @classmethod
+    def batch_get_pixelsize(cls, files, use_legacy_measurement=False):
+        """
+        Reads the scale bars of multiple images of the Tecnai or Talos TEM 
+        microscopes using the same text recognition as 
+        `tia.get_pixelsize_legacy()`, but runs tesseract only once for all 
+        images by passing it a list of image files, such that the start-up 
+        cost of the OCR engine is paid only once. Images for which the scale 
+        bar could not be read this way are calibrated one by one using 
+        `tia.get_pixelsize_legacy()`.
         
+        Parameters
+        ----------
+        files : list of str or `tia`
+            filenames or `tia` class instances of the images to calibrate
+        use_legacy_measurement : bool, optional
+            see `tia.get_pixelsize_legacy()`. The default is `False`.
+        
+        Returns
+        -------
+        list of tuple
+            `(pixelsize,unit)` for each of the images in `files`
+        """
+        ims = [f if isinstance(f,tia) else cls(f) for f in files]
+        
+        #measure bars and crop text, images without a bar are done separately
+        todo,barlengths,bartexts = [],[],[]
+        for i,im in enumerate(ims):
+            if len(im.scalebar) > 0:
+                corners,_,barlength = im._measure_scalebar(
+                    use_legacy_measurement)
+                todo.append(i)
+                barlengths.append(barlength)
+                bartexts.append(im._prep_bartext(corners))
+        
+        #write text images to temporary files and read all in a single call
+        texts = []
+        try:
+            import pytesseract
+            config = _tesseract_config()+' -c tessedit_parallelize=1'
+            with TemporaryDirectory() as tmpdir:
+                paths = []
+                for i,bartext in enumerate(bartexts):
+                    paths.append(os.path.join(tmpdir,f'{i}.png'))
+                    Image.fromarray(bartext).save(paths[-1])
+                listfile = os.path.join(tmpdir,'list.txt')
+                with open(listfile,'w') as f:
+                    f.write('\n'.join(paths)+'\n')
+                texts = pytesseract.image_to_string(listfile,config=config)
+            
+            #tesseract separates the text of each image with a form feed
+            texts = texts.split('\x0c')[:len(todo)]
+            if len(texts) != len(todo):
+                raise ValueError('tesseract returned text for {:} of {:} '
+                                 'images'.format(len(texts),len(todo)))
+        except Exception as e:
+            warn('could not read scale bar texts in a single batch ({:}), '
+                 'falling back to calibrating images one by one'.format(e),
+                 stacklevel=2)
+            texts = []
+        
+        #split value and unit and store on the class instances
+        done = set()
+        for i,text,barlength in zip(todo,texts,barlengths):
+            try:
+                value = float(_BAR_VALUE_RE.search(text).group())
+                unit = _BAR_UNIT_RE.search(text).group()
+            except AttributeError:
+                continue
+            if unit == 'um':
+                unit = 'µm'
+            ims[i].pixelsize = value/barlength
+            ims[i].unit = unit
+            done.add(i)
+        
+        #fall back to one by one calibration where the batch call failed
+        for i,im in enumerate(ims):
+            if i not in done:
+                im.get_pixelsize_legacy(
+                    use_legacy_measurement=use_legacy_measurement)
+        
+        return [(im.pixelsize,im.unit) for im in ims]
+    
+    def _measure_scalebar(self, use_legacy_measurement=False):
+        """
+        finds contour corners of the objects in the original scale bar sorted 
+        left to right, where the first item in corners is the scale bar and the
+        rest is from text, and measures the scale bar length in pixels. See 
+        `tia.get_pixelsize_legacy()`.
+        """
+        import cv2
+        
+        #rescale to uint8 for opencv, in place on a single temporary array
+        sb = self.scalebar
+        if self.dtype != np.uint8:
+            mn,mx = sb.min(),sb.max()
+            if issubclass(sb.dtype.type,np.floating):
+                tmp = sb - mn
+            else:
+                tmp = np.subtract(sb,mn,dtype=np.float64)
+            tmp /= (mx-mn)/255
+            sb = tmp.astype(np.uint8)
+        else:
+            #older opencv versions modify the input, which is read-only
+            sb = sb.copy()
+        #contours are the second to last return value in opencv 3 and 4
+        corners = cv2.findContours(
+            sb,cv2.RETR_LIST,cv2.CHAIN_APPROX_SIMPLE)[-2]
+        #sort left to right on the leftmost x of each contour (which is the x
+        #of its bounding rectangle), stable to keep the order of ties
+        left = np.fromiter((c[:,0,0].min() for c in corners),dtype=np.intp,
+                           count=len(corners))
+        corners = [corners[i] for i in np.argsort(left,kind='stable')]
+        
+        #length in pixels between top left corners of vertical bars
+        if use_legacy_measurement:
+            usecorners = [0,10]
+        else:
+            usecorners = [0,9]
+        barlength = corners[0][usecorners[1],0,0]-corners[0][usecorners[0],0,0]
+        
+        return corners,usecorners,barlength
+    
+    def _prep_bartext(self, corners, debug=False):
+        """
+        crops the text from the original scale bar using the contour corners 
+        from `tia._measure_scalebar()` and preprocesses it for OCR
+        """
+        import cv2
+        
+        #take the text of the databar with some padding
+        pad = int(6*self.shape[1]/1024)
+        bartext = self.scalebar[:,
+            corners[1][:,0,0].min()-pad:corners[-1][:,0,0].max()+pad+1
+        ]
+        bartext = bartext.max() - bartext
+        
+        #upscale if needed for OCR
+        if self.shape[1] < 4096:
+            if self.shape[1] < 2048:
+                factor = 4
+            else:
+                factor = 2
+            bartextshape = bartext.shape
+            bartext = cv2.resize(
+                bartext,
+                (factor*bartextshape[1],factor*bartextshape[0]),
+                interpolation = cv2.INTER_CUBIC
+            )
+            bartext = cv2.erode(
+                cv2.threshold(bartext,0,255,
+                              cv2.THRESH_BINARY+cv2.THRESH_OTSU)[1],
+                _ERODE_KERNEL
+            )
+            if debug:
+                print('- preprocessing text, resizing text image from',
+                      bartextshape,'to',bartext.shape)
+        
+        return bartext
+    
     def export_with_scalebar(self, filename=None, **kwargs):
         """
         saves an exported image of the TEM image with a scalebar in one of the 
@@ -466,7 +618,7 @@ class tia:
 
         Parameters
         ----------
-        filename : string or `None`, optional
+        filename : string, path-like or `None`, optional
             Filename + extension to use for the export file. The default is the
             filename sans extension of the original TEM file, with 
             '_exported.png' appended.
@@ -504,7 +656,9 @@ class tia:
             scale the brightness/contrast in the image to, or `'automatic'` to 
             autoscale the intensity to the 0.01th and 99.99th percentile of the 
             input image, or None for the min and max value in the original 
-            image. The default is `None`.
+            image. Values in the range are mapped linearly onto 0-255 in 
+            double precision and rounded down to 8 bit grey levels, values 
+            at or above the upper bound are set to 255. The default is `None`.
         resolution : int, optional
             the resolution along the x-axis (i.e. image width in pixels) to use
             for the exported image. The default is `None`, which uses the size 
@@ -568,16 +722,24 @@ class tia:
         store_settings : bool, optional
             when `True`, a .txt file is saved along with the image containing
             all settings passed to this function. The default is False
+        png_compress_level : int, optional
+            zlib compression level between 0 and 9 used when saving as .png.
+            Lower values save (much) faster at the cost of larger files, use 1
+            for previews or batch exports and 6 to 9 for archiving. The default
+            is 1.
+        optimize : bool, optional
+            whether to let PIL search for the optimal (smallest) encoding when
+            saving, which is slow. The default is False.
         """
         #check if pixelsize already calculated, otherwise call get_pixelsize
-        try:
-            pixelsize,unit = self.pixelsize,self.unit
-        except AttributeError:
-            pixelsize,unit = self.get_pixelsize()
+        if getattr(self,'unit',None) is None:
+            self.get_pixelsize()
+        pixelsize,unit = self.pixelsize,self.unit
         
         #set default export filename
-        if type(filename) != str:
-            filename = self.filename.rpartition('.')[0]+'_scalebar.png'
+        if not isinstance(filename,(str,os.PathLike)):
+            filename = os.path.splitext(self.filename)[0]+'_scalebar.png'
+        filename = os.fspath(filename)
         
         #check we're not overwriting the original file
         if filename==self.filename:
@@ -585,10 +747,9 @@ class tia:
                              'use a different filename for exporting.')
         
         #get image
-        exportim = self.image.copy()
+        exportim = self.image
         
         #call main export_with_scalebar function with correct pixelsize etc
-        from .utility import _export_with_scalebar
         _export_with_scalebar(exportim, pixelsize, unit, filename, **kwargs)
         
         
@@ -611,12 +772,18 @@ class velox:
     quiet : bool
         whether to print a list of images contained in the file when the class
         is initialized. The default is False.
+    chunk_cache : int
+        size in bytes of the HDF5 chunk cache of each dataset. This should fit
+        at least one chunk of the data, which for compressed video data often
+        contains multiple frames, to prevent decompressing the same chunk for
+        each frame that is read. The default is 64 MiB (the HDF5 default is
+        only 1 MiB).
     
     Returns
     -------
     `velox` class instance 
     """
-    def __init__(self,filename=None,quiet=False):
+    def __init__(self,filename=None,quiet=False,chunk_cache=64*1024**2):
         """init class instance, open file container"""
         import h5py
         
@@ -625,8 +792,7 @@ class velox:
             filename = 0
         
         #can also load nth file in folder
-        if type(filename)==int:
-            from glob import glob
+        if isinstance(filename,int):
             filenames = glob('*.emd')
             try:
                 filename = filenames[filename]
@@ -637,10 +803,11 @@ class velox:
         
         #load the file, if not found try appending file extension
         try:
-            self._emdfile = h5py.File(filename,'r')
+            self._emdfile = h5py.File(filename,'r',rdcc_nbytes=chunk_cache)
         except FileNotFoundError:
             try:
-                self._emdfile = h5py.File(filename+'.emd','r')
+                self._emdfile = h5py.File(filename+'.emd','r',
+                                          rdcc_nbytes=chunk_cache)
                 filename = filename+'.emd'
             except FileNotFoundError:
                 raise FileNotFoundError(f"the file '{filename}' was not found")
@@ -651,17 +818,19 @@ class velox:
         self.data_names = []
         self._data_type = []
         
+        #only open the datasets in the groups of supported data types
         i = 0
         for key,val in self._emdfile['Data'].items():
+            if not key in ('Image','SpectrumStream'):
+                continue
             for v in val.values():
-                #if 'Data' in v:
-                if key in ['Image','SpectrumStream']:
-                    self.data_list.append(v)
-                    self.data_names.append(key+f'{i:03d}')
-                    self._data_type.append(key)
-                    i+=1
+                self.data_list.append(v)
+                self.data_names.append(key+f'{i:03d}')
+                self._data_type.append(key)
+                i+=1
         
-        self._len = len(self.data_list)
+        #lookup table from dataset name to index
+        self._data_index = {n:i for i,n in enumerate(self.data_names)}
         
         if not quiet:
             print(self)
@@ -676,15 +845,20 @@ class velox:
     
     def __str__(self):
         """string method for printing class instance"""
+        #look up the dataset shapes in the file only once
+        try:
+            shapes = self._shapes
+        except AttributeError:
+            shapes = self._shapes = [d['Data'].shape for d in self.data_list]
+        
         s = self.__repr__()+'\n'
-        for i,n in enumerate(self.data_names):
-            imshape = self.data_list[i]['Data'].shape
+        for i,(n,imshape) in enumerate(zip(self.data_names,shapes)):
             s+=f"{i}: name='{n}', shape={imshape}\n"
         return s[:-1]#strips last newline
     
     def __len__(self):
         """allows for `len(velox)` to return number of images"""
-        return self._len
+        return len(self.data_list)
         
     def __getitem__(self,i):
         """make class indexable by returning image"""
@@ -708,8 +882,12 @@ class velox:
         `velox_dataset` or `velox_image` class instance
         """
         #allow for dataset index as well as its name/tag
-        if type(dataset) == str:
-            dataset = self.data_names.index(dataset)
+        if isinstance(dataset,str):
+            try:
+                dataset = self._data_index[dataset]
+            except KeyError:
+                raise ValueError(f"'{dataset}' is not a dataset in "
+                                 f"'{self.filename}'")
         
         if self._data_type[dataset] == 'Image':
             return velox_image(self,dataset)
@@ -721,25 +899,31 @@ class velox:
     def print_file_struct(self):
         """prints a formatted overview of the structure of the .emd file 
         container, useful for accessing additional data manually"""
-        self._recursive_struct_print(self._emdfile)
+        self._struct_print(self._emdfile)
 
-    def _recursive_struct_print(self,root,prefix='|'):
-        """see `print_file_struct"""
-        for i in root:
-            #safeguard against infinite recursion
-            if len(prefix)>20:
+    def _struct_print(self,root,max_depth=20):
+        """see `print_file_struct`, walks the file tree depth first using a
+        stack rather than recursion"""
+        #stack of (group, key, depth), reversed to print in original order
+        stack = [(root,key,0) for key in reversed(root)]
+        while stack:
+            group,key,depth = stack.pop()
+            prefix = '|'+'-'*depth
+            
+            #safeguard against too deeply nested files
+            if depth >= max_depth:
                 print(prefix+'-MAX RECURSION DEPTH')
+                continue
             
-            #for a tag, print and call function on child
-            elif type(i)==str:
-                print(prefix+i)
-                if len(root[i])>0:
-                    self._recursive_print(root[i],prefix=prefix+'-')
+            #print the tag and add any children to the stack
+            print(prefix+key)
+            item = group[key]
+            if hasattr(item,'keys'):
+                stack.extend((item,k,depth+1) for k in reversed(item))
             
-            #for data, print the root data __repr__ method
-            else:
-                print(prefix+f'-{root.__repr__()}')
-                break
+            #for data, print the data __repr__ method
+            elif item.size > 0:
+                print(prefix+f'--{item.__repr__()}')
 
 class velox_dataset:
     """
@@ -757,36 +941,49 @@ class velox_dataset:
         self.name = parent.data_names[im]
         self.data_type = parent._data_type[im]
         self.index = im
-        self.shape = self._imageData['Data'].shape
-        self.dtype = self._imageData['Data'].dtype
+        
+        #keep the h5py dataset object, such that repeated (frame) access does
+        #not have to look it up in the file again
+        self._raw = data = self._imageData['Data']
+        self.shape = data.shape
+        self.dtype = data.dtype
     
     def get_raw_data(self):
         """
         returns a reference to the raw data of the dataset (without any 
         re-indexing being applied or so)
         """
-        return self._imageData['Data']
+        return self._raw
 
     def get_metadata(self,i=0):
         """extracts the metadata corresponding to the image as JSON dict
         
+        Parameters
+        ----------
+        i : int, optional
+            index of the frame to get the metadata for. The default is 0.
+        
         Returns
         -------
         dict containing the metadata
         """
-        #only need to read once, otherwise just return from previous read
-        if hasattr(self,'metadata'):
+        #only need to read each frame once, otherwise return from previous read
+        try:
+            self.metadata = self._metadata_cache[i]
             return self.metadata
+        except AttributeError:
+            self._metadata_cache = {}
+        except KeyError:
+            pass
         
         #load metadata as int numpy array and convert back to bytes, this is
         #because the datatype is incorrectly listed as int in the HDF5 file. By
         #default a large block is reserved in the file, unused space contains
         #trailing zeros, have to be stripped before it can be converted by JSON
-        metadata = np.trim_zeros(self._imageData['Metadata'][:,i]).tobytes()
+        metadata = self._imageData['Metadata'][:,i].tobytes().rstrip(b'\x00')
         
         #convert json to dict and store
-        import json
-        self.metadata = json.loads(metadata)
+        self.metadata = self._metadata_cache[i] = json.loads(metadata)
         return self.metadata
 
     def get_detector(self):
@@ -863,7 +1060,7 @@ class velox_dataset:
         metadata = self.get_metadata()
         
         if filename is None:
-            filename =  self.filename.rpartition('.')[0]+\
+            filename =  os.path.splitext(self.filename)[0]+\
                 f'_image-{self.index:02d}_metadata.txt'
         
         with open(filename,'w') as f:
@@ -908,16 +1105,15 @@ class velox_image(velox_dataset):
         #init parent class and get attribs
         super().__init__(parent,im)
         
-        #change dim order to (frame,y,x) and store length as number of frames
+        #change dim order to (frame,y,x), length is the number of frames
         self.shape = (self.shape[-1],*self.shape[:-1])
-        self._len = self.shape[0]
 
     def __repr__(self):
         return f"scm_electron_microscopes.velox_image('{self.filename}','{self.name}')"
 
     def __len__(self):
         """add no. video frames as length"""
-        return self._len
+        return self.shape[0]
             
     def __getitem__(self,i):
         """make class indexable by returning appropriate video frame"""
@@ -926,6 +1122,7 @@ class velox_image(velox_dataset):
     def __iter__(self):
         """initialize iterator for next function"""
         self._iter_n = 0
+        self._iter_block = (0,None)
         return self
 
     def __next__(self):
@@ -937,26 +1134,51 @@ class velox_image(velox_dataset):
         #increment iterator before return call
         self._iter_n += 1
         
-        #check end condition or return using __getitem__
+        #check end condition
         if self._iter_n > len(self):
+            self._iter_block = (0,None)
             raise StopIteration
-        else:
-            return self[self._iter_n-1]
+        
+        #read a block of frames per HDF5 chunk along the frame axis, such that
+        #each chunk is read and decompressed only once rather than per frame.
+        #The block is capped in size, as chunks may be deep along the frame
+        #axis while small in y and x
+        i = self._iter_n-1
+        start,block = self._iter_block
+        if block is None or i >= start+block.shape[-1]:
+            rawdata = self._raw
+            n = rawdata.chunks[-1] if rawdata.chunks else 1
+            frame_nbytes = np.prod(self.shape[1:])*rawdata.dtype.itemsize
+            n = max(1, min(n, _ITER_BLOCK_NBYTES//frame_nbytes))
+            start = i - i%n
+            block = rawdata[...,start:start+n]
+            self._iter_block = (start,block)
+        
+        #return contiguous copy of frame, identical to get_frame
+        return np.ascontiguousarray(block[...,i-start])
 
     def get_data(self):
         """Loads and returns the full image data as numpy array
         
         Returns
         -------
-        numpy.ndarray of pixel value
-        s"""
-        #note that loading per image is faster than loading the entire array
-        #as it is stored in a different byte order than used in the HDF5 file
-        
-        rawdata = self.get_raw_data()
-        return np.array(
-            [rawdata[:,:,i] for i in range(len(self))]
-        )
+        numpy.ndarray of pixel values with dimensions (frame,y,x)
+        
+        Notes
+        -----
+        The data is read in a single call and then reordered in memory, such 
+        that peak memory use is briefly twice the size of the data.
+        """
+        #read the entire dataset in a single call into a buffer with native
+        #byte order, such that HDF5 converts the byte order in one pass rather
+        #than per image. Note that reading frames from multiple threads does
+        #not help here, as h5py serializes all calls to the HDF5 library
+        rawdata = self._raw
+        data = np.empty(rawdata.shape,dtype=rawdata.dtype.newbyteorder('='))
+        rawdata.read_direct(data)
+
+        #change dim order to (frame,y,x) and make contiguous per frame
+        return np.ascontiguousarray(data.transpose(2,0,1))
 
     def get_frame(self,i):
         """returns specific image / video frame from the dataset
@@ -972,7 +1194,7 @@ class velox_image(velox_dataset):
         """
         if i >= len(self):
             raise IndexError(f'index {i} does not fit in length {len(self)}')
-        return self.get_raw_data()[...,i] 
+        return self._raw[...,i]
     
     def get_pixelsize(self,convert=None):
         """
@@ -999,21 +1221,12 @@ class velox_image(velox_dataset):
         
         #if no unit is given, determine from y-pizelsize
         if convert is None:
-            if pixelsize[0] >= 10e-3:
-                convert = 'm'
-            elif pixelsize[0] < 10e-3 and pixelsize[0] >= 10e-6:
-                convert = 'mm'
-            elif pixelsize[0] < 10e-6 and pixelsize[0] >= 10e-9:
-                convert = 'µm'
-            elif pixelsize[0] < 10e-9 and pixelsize[0] >= 10e-12:
-                convert = 'nm'
-            else:
-                convert = 'pm'
+            convert = _auto_length_unit(pixelsize[0],min_exp=-2)[0]
             
-        #convert unit
-        from .utility import _convert_length
+        #convert unit of each axis
         for i in range(len(pixelsize)):
-            pixelsize[i] = _convert_length(pixelsize[i], unit[i], convert)[0]
+            pixelsize[i],unit[i] = _convert_length(pixelsize[i],unit[i],convert)
+        convert = unit[0]
 
         #store and return
         self.pixelsize = pixelsize
@@ -1115,7 +1328,7 @@ class velox_image(velox_dataset):
 
         Parameters
         ----------
-        filename : string or `None`, optional
+        filename : string, path-like or `None`, optional
             Filename + extension to use for the export file. The default is the
             filename sans extension of the original TEM file, with 
             '_exported.png' appended.
@@ -1155,7 +1368,9 @@ class velox_image(velox_dataset):
             scale the brightness/contrast in the image to, or `'automatic'` to 
             autoscale the intensity to the 0.01th and 99.99th percentile of the 
             input image, or None for the min and max value in the original 
-            image. The default is `None`.
+            image. Values in the range are mapped linearly onto 0-255 in 
+            double precision and rounded down to 8 bit grey levels, values 
+            at or above the upper bound are set to 255. The default is `None`.
         resolution : int, optional
             the resolution along the x-axis (i.e. image width in pixels) to use
             for the exported image. The default is `None`, which uses the size 
@@ -1219,18 +1434,26 @@ class velox_image(velox_dataset):
         store_settings : bool, optional
             when `True`, a .txt file is saved along with the image containing
             all settings passed to this function. The default is False
+        png_compress_level : int, optional
+            zlib compression level between 0 and 9 used when saving as .png.
+            Lower values save (much) faster at the cost of larger files, use 1
+            for previews or batch exports and 6 to 9 for archiving. The default
+            is 1.
+        optimize : bool, optional
+            whether to let PIL search for the optimal (smallest) encoding when
+            saving, which is slow. The default is False.
         """
         #check if pixelsize already calculated, otherwise call get_pixelsize
         #note we only pass the x pixelsize to the scalebar function
-        try:
-            pixelsize,unit = self.pixelsize,self.unit
-        except AttributeError:
-            pixelsize,unit = self.get_pixelsize()
+        if getattr(self,'unit',None) is None:
+            self.get_pixelsize()
+        pixelsize,unit = self.pixelsize,self.unit
         
         #set default export filename
-        if type(filename) != str:
-            filename = self.filename.rpartition('.')[0]+\
+        if not isinstance(filename,(str,os.PathLike)):
+            filename = os.path.splitext(self.filename)[0]+\
                 f'_image-{self.index:02d}_scalebar.png'
+        filename = os.fspath(filename)
         
         #check we're not overwriting the original file
         if filename==self.filename:
@@ -1241,8 +1464,67 @@ class velox_image(velox_dataset):
         exportim = self.get_frame(frame)
         
         #call main export_with_scalebar function with correct pixelsize etc
-        from .utility import _export_with_scalebar
         _export_with_scalebar(exportim, pixelsize[1], unit, filename, **kwargs)
+    
+    def export_stack_with_scalebars(self, frame_range=None, 
+                                    filename_prefix=None, **kwargs):
+        """
+        saves each frame in a range of frames as separate image with a 
+        scalebar, see `velox_image.export_with_scalebar()`. The pixel size 
+        and file name prefix are determined only once for all frames, and the
+        scale bar text and font are looked up from cache after the first 
+        frame, which is faster than calling `export_with_scalebar()` for each 
+        frame.
+
+        Parameters
+        ----------
+        frame_range : int or tuple of int, optional
+            int specifying which frame, or tuple of (start,stop) ints 
+            specifying which frames, to export. The default is all frames in 
+            the dataset.
+        filename_prefix : str, optional
+            filename to use for the exported images without file extension, to
+            which the frame number (zero padded to the number of frames in 
+            the dataset) and '_scalebar.png' are appended. The 
+            default is the filename of the original file sans extension with 
+            the image index appended.
+        **kwargs
+            any further keyword arguments are passed on to 
+            `export_with_scalebar()` for each frame. Note that `show_figure`
+            defaults to `False` here.
+
+        Returns
+        -------
+        list of str
+            filenames of the exported images
+        """
+        #resolve everything that is the same for all frames only once
+        if getattr(self,'unit',None) is None:
+            self.get_pixelsize()
+        pixelsize,unit = self.pixelsize,self.unit
+        
+        if frame_range is None:
+            frame_range = (0,len(self))
+        elif isinstance(frame_range,int):
+            frame_range = (frame_range,frame_range+1)
+        frames = range(*frame_range)
+        
+        if filename_prefix is None:
+            filename_prefix = os.path.splitext(self.filename)[0]+\
+                f'_image-{self.index:02d}'
+        ndigits = len(str(max(len(self)-1,1)))
+        
+        kwargs.setdefault('show_figure',False)
+        
+        #export frames one by one to avoid loading all data in memory
+        filenames = []
+        for i in frames:
+            filename = f'{filename_prefix}_frame-{i:0{ndigits}d}_scalebar.png'
+            _export_with_scalebar(
+                self.get_frame(i), pixelsize[1], unit, filename, **kwargs)
+            filenames.append(filename)
+        
+        return filenames
         
         
 class velox_edx(velox_dataset):
@@ -1253,9 +1535,8 @@ class velox_edx(velox_dataset):
         #init parent class and get attribs
         super().__init__(parent,im)
         
-        #change dim order to (frame,y,x) and store length as number of frames
+        #change dim order to (frame,y,x), length is the number of frames
         self.shape = (self.shape[-1],*self.shape[:-1])
-        self._len = self.shape[0]
         self._pixelflag = 2**16-1
     
     def get_image(self,energy_ranges=None,frame_range=None,binning=1):
@@ -1272,18 +1553,20 @@ class velox_edx(velox_dataset):
         frame_range : tuple, optional
             Tuple of (min,max) for the frame indices to sum the counts for. The
             default is None which sums all frames.
+        binning : int, optional
+            number of pixels along each axis to sum the counts of into a single
+            pixel of the returned image. When the scan size is not a multiple 
+            of `binning`, the remaining pixels at the bottom and right edge are
+            discarded. The default is 1.
 
         Returns
         -------
         2D numpy.array
 
         """
-        framelocs = list(self._imageData['FrameLocationTable'][:,0])
-        
         md = self.get_metadata()
         nx = int(md['Scan']['ScanSize']['width'])
         ny = int(md['Scan']['ScanSize']['height'])
-        #nf = len(framelocs)
         #ne = 2**12#this is hardcoded for now, cannot find it in metadata
         
         pixelflag = self._pixelflag
@@ -1293,57 +1576,83 @@ class velox_edx(velox_dataset):
         energy_step = float(det_md['Dispersion'])/1000
         energy_start = float(det_md['BeginEnergy'])/1000
         
-        rawdata = self.get_raw_data()
+        rawdata = self._raw
         
+        #only read the stream of the given frames, using the start index of 
+        #each frame in the stream (and the end of the stream for the last).
+        #The (small) table is read whole, which is faster than letting HDF5
+        #select the column
         if not frame_range is None:
             start,stop = frame_range
-            framelocs = framelocs+[len(rawdata)]
-            rawdata = rawdata[framelocs[start]:framelocs[stop]]
+            framelocs = np.append(
+                self._imageData['FrameLocationTable'][()][:,0],len(rawdata))
+            streamstart,streamstop = int(framelocs[start]),int(framelocs[stop])
         else:
-            rawdata = rawdata[:]
-        
+            streamstart,streamstop = 0,len(rawdata)
         
-        #when specific energy ranges are specified,take flag values and 'or'
-        # each range onto the boolean mask
+        #when specific energy ranges are specified, convert the energies to 
+        #(integer) channel indices such that the stream values are compared 
+        #as integers without conversion to float
         if not energy_ranges is None:
-            mask = rawdata==pixelflag
+            nchannels = np.iinfo(rawdata.dtype).max+1
+            channel_ranges = []
             for start,stop in energy_ranges:
-                start = (start-energy_offset)/energy_step
-                stop = (stop-energy_offset)/energy_step
-                mask = np.logical_or(
-                    mask,
-                    np.logical_and(start<=rawdata,rawdata<stop)
-                )
-            rawdata = rawdata[mask]
-        
-        #otherwise skip just values below the energy_start value
-        else:
-            rawdata = rawdata[
-                (rawdata==pixelflag)|(rawdata>=energy_start)
-            ]
-        
-        from numba import jit
-        @jit()
-        def _construct_spectrumim(stream):
-            res = np.zeros((ny//binning,nx//binning),dtype=np.uint16)
-            x = 0
-            y = 0
-            #loop over all stream values
-            for i,v in enumerate(stream):
-                #if new pixel flag, increment x
-                if v == pixelflag:
-                    x += 1
-                    if x == nx:#if imwidth reached, reset x and incr y
-                        x = 0
-                        y += 1
-                        if y == ny:#if imheight reached, reset y
-                            y = 0
-                else:
-                    res[y//binning,x//binning] += 1
+                start = int(np.ceil((start-energy_offset)/energy_step))
+                stop = int(np.ceil((stop-energy_offset)/energy_step))
+                start = min(max(start,0),nchannels)
+                stop = min(max(stop,start),nchannels)
+                if start < stop:
+                    channel_ranges.append((start,stop))
+        
+        #read and process the stream in blocks aligned to the HDF5 chunks, 
+        #such that (for long streams) the full stream is never in memory
+        blocksize = 2**24
+        if rawdata.chunks:
+            blocksize = max(blocksize//rawdata.chunks[0],1)*rawdata.chunks[0]
+        npix = nx*ny
+        counts = np.zeros(npix,dtype=np.int64)
+        pix = 0
+        for i in range(streamstart-streamstart%blocksize,streamstop,blocksize):
+            stream = rawdata[max(i,streamstart):min(i+blocksize,streamstop)]
             
-            return res
-        
-        return _construct_spectrumim(rawdata)
+            #take flag values and 'or' each range onto the boolean mask in 
+            #place, testing start<=v<stop in a single comparison as 
+            #(v-start)<(stop-start) using the wrap around of unsigned ints
+            if not energy_ranges is None:
+                mask = stream==pixelflag
+                shifted = np.empty_like(stream)
+                inrange = np.empty_like(mask)
+                for start,stop in channel_ranges:
+                    np.subtract(stream,start,out=shifted)
+                    np.less(shifted,stop-start,out=inrange)
+                    mask |= inrange
+                stream = stream[mask]
+            
+            #otherwise skip just values below the energy_start value
+            else:
+                stream = stream[(stream==pixelflag)|(stream>=energy_start)]
+            
+            #every pixel flag advances the scan position by one pixel, so the
+            #counts of consecutive pixels are the number of values in between
+            #the flags, starting at the pixel where the previous block ended.
+            #The scan wraps around at the end of each frame, so sum the 
+            #counts per frame
+            flags = np.flatnonzero(stream==pixelflag)
+            blockcounts = np.diff(flags,prepend=-1,append=len(stream))-1
+            n = len(blockcounts)
+            nframes = -(-(pix+n)//npix)
+            blockcounts = np.pad(blockcounts,(pix,nframes*npix-pix-n))
+            counts += blockcounts.reshape(nframes,npix).sum(axis=0)
+            pix = (pix+n-1) % npix
+        counts = counts.reshape(ny,nx)
+        
+        #sum counts in blocks of binning*binning pixels, discarding the 
+        #remainder of rows and columns when binning does not divide the size
+        counts = counts[:ny//binning*binning,:nx//binning*binning]
+        counts = counts.reshape(
+            ny//binning,binning,nx//binning,binning).sum(axis=(1,3))
+        
+        return counts.astype(np.uint16)
     
     def get_spectrum(self):
         """
@@ -1372,7 +1681,7 @@ class velox_edx(velox_dataset):
             spectrum = self._emdfile['Data/Spectrum']
             counts = spectrum[list(spectrum.keys())[0]]['Data'][:,0][:]
         else:
-            data = self.get_raw_data()[:]
+            data = self._raw[:]
             counts = np.bincount(data[data!=2**16-1],minlength=2**12)
        
         return energies,counts
@@ -1396,7 +1705,7 @@ class sis:
     
     def __init__(self,filename):
         #raise error if wrong format or file does not exist
-        if type(filename) != str:
+        if not isinstance(filename,str):
             raise TypeError('`filename` must be of type `str`')
         if not os.path.exists(filename):
             if os.path.exists(filename + '.tif'):
@@ -1410,7 +1719,7 @@ class sis:
         #load the image
         self.PIL_image = Image.open(filename)
         im = np.array(self.PIL_image)
-        self.shape = np.shape(im)
+        self.shape = im.shape
         self.image = im[:self.shape[1]]
         self.dtype = self.image.dtype
     
@@ -1447,7 +1756,6 @@ class sis:
         #old tecnai 10 uses 33560 tag and a more complex format based on
         #Olympus analySIS software format. Only pixelsize is implemented atm
         #see https://github.com/ome/bioformats/blob/develop/components/formats-gpl/src/loci/formats/in/SISReader.java
-        from struct import unpack
         try:
             with open(self.filename,'rb') as f:
                 #find location of metadata from tag, then 64 bytes further the
@@ -1465,7 +1773,7 @@ class sis:
                 if -12>=unit or unit>1:#check if value is reasonable
                     raise EOFError()
                 pixelsize_x = unpack('d',f.read(8))[0]#read double, = pixelsize
-                #pixelsize_y = unpack('d',f.read(8))[0]#same for y pixelsize
+                #(the y pixelsize follows as another double, but is unused)
             
         except (KeyError, EOFError):
             raise KeyError('pixel size not encoded in file, are you sure this'
@@ -1473,32 +1781,13 @@ class sis:
       
         #set the pixelsize to meter using the unit exponent/power of 10
         pixelsize_x *= 10**unit
-        #pixelsize_y *= 10**unit
-        
         
         #find the right unit and rescale for convenience
         if convert is None:
-            if pixelsize_x >= 10e-3:
-                unit = 'm'
-            elif pixelsize_x < 10e-3 and pixelsize_x >= 10e-6:
-                unit = 'mm'
-                pixelsize_x = 1e3*pixelsize_x
-                #pixelsize_y = 1e3*pixelsize_y
-            elif pixelsize_x < 10e-6 and pixelsize_x >= 10e-9:
-                unit = 'µm'
-                pixelsize_x = 1e6*pixelsize_x
-                #pixelsize_y = 1e6*pixelsize_y
-            elif pixelsize_x < 10e-9 and pixelsize_x >= 10e-12:
-                unit = 'nm'
-                pixelsize_x = 1e9*pixelsize_x
-                #pixelsize_y = 1e9*pixelsize_y
-            else:
-                unit = 'pm'
-                pixelsize_x = 1e12*pixelsize_x
-                #pixelsize_y = 1e9*pixelsize_y
+            unit,factor = _auto_length_unit(pixelsize_x,min_exp=-2)
+            pixelsize_x = factor*pixelsize_x
         #else use given unit
         else:
-            from .utility import _convert_length
             pixelsize_x,unit = _convert_length(pixelsize_x, 'm', convert)
             
         #store and return
@@ -1515,7 +1804,7 @@ class sis:
 
         Parameters
         ----------
-        filename : string or `None`, optional
+        filename : string, path-like or `None`, optional
             Filename + extension to use for the export file. The default is the
             filename sans extension of the original TEM file, with 
             '_exported.png' appended.
@@ -1553,7 +1842,9 @@ class sis:
             scale the brightness/contrast in the image to, or `'automatic'` to 
             autoscale the intensity to the 0.01th and 99.99th percentile of the 
             input image, or None for the min and max value in the original 
-            image. The default is `None`.
+            image. Values in the range are mapped linearly onto 0-255 in 
+            double precision and rounded down to 8 bit grey levels, values 
+            at or above the upper bound are set to 255. The default is `None`.
         resolution : int, optional
             the resolution along the x-axis (i.e. image width in pixels) to use
             for the exported image. The default is `None`, which uses the size 
@@ -1617,16 +1908,24 @@ class sis:
         store_settings : bool, optional
             when `True`, a .txt file is saved along with the image containing
             all settings passed to this function. The default is False
+        png_compress_level : int, optional
+            zlib compression level between 0 and 9 used when saving as .png.
+            Lower values save (much) faster at the cost of larger files, use 1
+            for previews or batch exports and 6 to 9 for archiving. The default
+            is 1.
+        optimize : bool, optional
+            whether to let PIL search for the optimal (smallest) encoding when
+            saving, which is slow. The default is False.
         """
         #check if pixelsize already calculated, otherwise call get_pixelsize
-        try:
-            pixelsize,unit = self.pixelsize,self.unit
-        except AttributeError:
-            pixelsize,unit = self.get_pixelsize()
+        if getattr(self,'unit',None) is None:
+            self.get_pixelsize()
+        pixelsize,unit = self.pixelsize,self.unit
         
         #set default export filename
-        if type(filename) != str:
-            filename = self.filename.rpartition('.')[0]+'_scalebar.png'
+        if not isinstance(filename,(str,os.PathLike)):
+            filename = os.path.splitext(self.filename)[0]+'_scalebar.png'
+        filename = os.fspath(filename)
         
         #check we're not overwriting the original file
         if filename==self.filename:
@@ -1634,10 +1933,9 @@ class sis:
                              'use a different filename for exporting.')
         
         #get image
-        exportim = self.image.copy()
+        exportim = self.image
         
         #call main export_with_scalebar function with correct pixelsize etc
-        from .utility import _export_with_scalebar
         _export_with_scalebar(exportim, pixelsize, unit, filename, **kwargs)
 
 
@@ -1660,13 +1958,20 @@ class tecnai(tia):
     --------
     `tia`
     """
+    #only warn on the first instance to avoid the cost of the warnings
+    #machinery for every file that is loaded
+    _warned = False
+    
     def __init__(self,*args,**kwargs):
-        warn('The tecnai and Talos classes have been renamed to the `tia` '
-             'class to avoid confusion between data aquired using the older '
-             'TIA and newer Velox software from version 3.0.0 onwards. The old'
-             ' names are available for backwards compatibility and should '
-             'behave identically, but their use is discouraged.',
-             DeprecationWarning,stacklevel=2)
+        if not tecnai._warned:
+            warn('The tecnai and Talos classes have been renamed to the '
+                 '`tia` class to avoid confusion between data aquired using '
+                 'the older TIA and newer Velox software from version 3.0.0 '
+                 'onwards. The old names are available for backwards '
+                 'compatibility and should behave identically, but their use '
+                 'is discouraged.',
+                 DeprecationWarning,stacklevel=2)
+            tecnai._warned = True
         super().__init__(*args,**kwargs)
 
 filterwarnings("default", category=DeprecationWarning,module='talos')
@@ -1686,11 +1991,18 @@ class talos(tia):
     --------
     `tia`
     """
+    #only warn on the first instance to avoid the cost of the warnings
+    #machinery for every file that is loaded
+    _warned = False
+    
     def __init__(self,*args,**kwargs):
-        warn('The tecnai and Talos classes have been renamed to the `tia` '
-             'class to avoid confusion between data aquired using the older '
-             'TIA and newer Velox software from version 3.0.0 onwards. The old'
-             ' names are available for backwards compatibility and should '
-             'behave identically, but their use is discouraged.',
-             DeprecationWarning,stacklevel=2)
+        if not talos._warned:
+            warn('The tecnai and Talos classes have been renamed to the '
+                 '`tia` class to avoid confusion between data aquired using '
+                 'the older TIA and newer Velox software from version 3.0.0 '
+                 'onwards. The old names are available for backwards '
+                 'compatibility and should behave identically, but their use '
+                 'is discouraged.',
+                 DeprecationWarning,stacklevel=2)
+            talos._warned = True
         super().__init__(*args,**kwargs)
@@ -1,5 +1,8 @@
 import numpy as np
+import os
 from warnings import warn
+from functools import lru_cache
+from bisect import bisect_left
 
 class util:
     """utility functions"""
@@ -74,13 +77,43 @@ class util:
         plt.ylabel('occurrence')
         plt.show(block=False)
 
+#power of ten with respect to meter for all supported units of length
+_LENGTH_UNITS = {
+    'fm':-15, 'pm':-12, 'Å':-10, 'nm':-9, 'µm':-6, 'mm':-3, 'cm':-2, 'dm':-1,
+    'm':0, 'dam':1, 'hm':2, 'km':3,
+}
+
+#alternative spellings of units with special characters
+_UNIT_ALIASES = {'um':'µm', 'A':'Å'}
+
+#precomputed conversion factors for all (unit,convert) combinations
+_LENGTH_FACTORS = {
+    (unit,convert): 10.0**(exp_unit-exp_convert)
+    for unit,exp_unit in _LENGTH_UNITS.items()
+    for convert,exp_convert in _LENGTH_UNITS.items()
+}
+
+def _auto_length_unit(value,min_exp=-3,units=('m','mm','µm','nm','pm')):
+    """
+    chooses a convenient unit for a length `value` in meter, being the first
+    unit in `units` for which the value is at least 10**min_exp, or the last 
+    unit in `units` if there is none. Returns the unit and the conversion 
+    factor from meter.
+    """
+    for unit in units[:-1]:
+        #threshold from a decimal string so it is exactly equal to the float
+        #literal, e.g. 1e-9 rather than 1e-3*1e-6
+        if value >= float('1e'+str(_LENGTH_UNITS[unit]+min_exp)):
+            return unit,_LENGTH_FACTORS['m',unit]
+    return units[-1],_LENGTH_FACTORS['m',units[-1]]
+
 def _export_with_scalebar(exportim,pixelsize,unit,filename,preprocess=None,
         crop=None,crop_unit='pixels',intensity_range=None,resolution=None,
         draw_bar=True,barsize=None,scale=1,loc=2,convert=None,text=None,
         draw_text=True,font='arialbd.ttf',fontsize=16,fontbaseline=10,
         fontpad=10,barthickness=16,barpad=10,draw_box=True,invert=False,
         boxalpha=0.8,boxpad=10,save=True,show_figure=True,store_settings=False,
-        ):
+        png_compress_level=1,optimize=False):
     """
     see top level export_with_scalebar functions for docs
     """
@@ -98,19 +131,19 @@ def _export_with_scalebar(exportim,pixelsize,unit,filename,preprocess=None,
             except (ImportError,NameError):
                 pass
         #store to disk
-        with open(filename.rpartition('.')[0]+'_settings.txt','w') as f:
+        with open(os.path.splitext(filename)[0]+'_settings.txt','w') as f:
             for key,val in items.items():
                 if isinstance(val,str):
                     f.write(key+" = '"+val+"',\n")
                 else:
                     f.write(key+" = "+str(val)+",\n")
     #imports
-    import matplotlib.pyplot as plt
     from PIL import Image
     
-    #optionally call preprocess function
+    #optionally call preprocess function on a copy, as it may modify the
+    #image in place and the original data is passed without copying
     if not preprocess is None:
-        exportim = preprocess(exportim)
+        exportim = preprocess(exportim.copy())
 
     #check color image
     if exportim.ndim > 2:
@@ -126,6 +159,9 @@ def _export_with_scalebar(exportim,pixelsize,unit,filename,preprocess=None,
         pixelsize,unit = _convert_length(pixelsize, unit, convert)
             
     if show_figure:
+        #only import pyplot when actually showing figures as it is slow
+        import matplotlib.pyplot as plt
+        
         #draw original figure before changing exportim
         fig,ax = plt.subplots(1,1)
         ax.imshow(exportim,cmap='gray')
@@ -209,44 +245,43 @@ def _export_with_scalebar(exportim,pixelsize,unit,filename,preprocess=None,
             intensity_range = (np.iinfo(exportim.dtype).min,
                                np.iinfo(exportim.dtype).max)
         else:#for floats fall back to default data min max 
-            (exportim.min(),exportim.max())
+            intensity_range = (exportim.min(),exportim.max())
     elif intensity_range == 'auto' or intensity_range == 'automatic':
-        intensity_range = (
-            np.percentile(exportim,0.01),
-            np.percentile(exportim,99.99)
-        )
-    elif not type(intensity_range) in [tuple,list] or len(intensity_range)!=2:
+        #both percentiles from a single (partition based) pass over the data
+        intensity_range = tuple(np.percentile(exportim,(0.01,99.99)))
+    elif not isinstance(intensity_range,(tuple,list)) or \
+            len(intensity_range)!=2:
         raise TypeError("`intensity_range` must be None, 'automatic' or "
                         "2-tuple of values")
     
-    #rescale the intensity without int overflow
+    #rescale the intensity to 0-255, clipping values outside of the range. 
+    #Done in place on a single float64 buffer (which also avoids int overflow
+    #and float32 rounding) and written directly to 8 bit, as the exported 
+    #image is always 8 bit. Values at or above imax are set to 255 explicitly
+    #so that saturated pixels are not truncated to 254
     imin, imax = intensity_range
-    exportim[exportim < imin] = imin  
-    exportim[:,:] = exportim[:,:] - imin
-    imax = imax - imin
-    mask = exportim < imax
-    exportim[~mask] = 255
-    exportim[mask] = exportim[mask]*(255/imax)
-    
-    #convert datatype if not already uint8
-    if exportim.dtype != np.uint8:
-        exportim = exportim.astype(np.uint8)
+    if imax > imin:
+        scaled = exportim.astype(np.float64)
+        np.clip(scaled,imin,imax,out=scaled)
+        scaled -= imin
+        scaled *= 255/(imax-imin)
+        np.putmask(scaled,exportim>=imax,255)
+        exportim = np.empty(exportim.shape,dtype=np.uint8)
+        np.copyto(exportim,scaled,casting='unsafe')
+        del scaled
+    else:
+        exportim = np.full(exportim.shape,255,dtype=np.uint8)
     
     #set default scalebar to original scalebar or calculate len
     if barsize is None:
         #take 15% of image width and round to nearest in list of 'nice' vals
-        barsize = scale*0.12*exportim.shape[1]*pixelsize
-        lst = [
-            0.01, 0.02, 0.025, 0.03, 0.04, 0.05, 0.1, 0.2, 0.25, 0.3, 0.4, 0.5,
-            1, 2, 3, 4, 5, 10, 20, 25, 30, 40, 50, 100, 200, 250, 300,
-            400, 500, 1000, 2000, 2500, 3000, 4000, 5000, 6000, 8000, 10000
-        ]
-        barsize = lst[min(range(len(lst)), key=lambda i: abs(lst[i]-barsize))]
+        barsize = _nice_barsize(scale*0.12*exportim.shape[1]*pixelsize)
     
     #determine len of scalebar on im
     barsize_px = barsize/pixelsize
     
-    #convert to PIL image object
+    #convert to PIL image object, for a C-contiguous uint8 array (as created 
+    #by the rescaling above) PIL wraps the buffer via frombuffer without copy
     exportim = Image.fromarray(exportim,'L')
     
     #set default resolution or scale image and correct barsize_px
@@ -289,15 +324,15 @@ def _export_with_scalebar(exportim,pixelsize,unit,filename,preprocess=None,
                             text = '{:.3f} '.format(round(barsize,3))+unit
         
             #get size of text
-            from PIL import ImageFont
-            font = ImageFont.truetype(font,size=int(fontsize))
-            text_bbox = font.getbbox(text)
+            fontsize = int(fontsize)
+            fnt = _get_font(font,fontsize)
+            text_bbox = fnt.getbbox(text)
             offset = (text_bbox[0],text_bbox[1])
             textsize = (text_bbox[2]-text_bbox[0],text_bbox[3]-text_bbox[1])
             
             #correct baseline for mu in case of micrometer
             if 'µ' in text:
-                bb = font.getbbox(text.replace('µ','u'))
+                bb = fnt.getbbox(text.replace('µ','u'))
                 textsize = (textsize[0],bb[3]-bb[1])
         
         else:
@@ -338,22 +373,16 @@ def _export_with_scalebar(exportim,pixelsize,unit,filename,preprocess=None,
         
         #put box behind bar / text for enhanced contrast
         if draw_box:
-            exportim = np.array(exportim)
-            subim = exportim[int(y):int(y+boxheight), int(x):int(x+boxwidth)]
             if invert:
-                subim = np.average(
-                    [np.zeros(subim.shape),subim],
-                    axis=0,
-                    weights=[boxalpha,1-boxalpha]
-                )
+                boxcol = 0
             else:
-                subim = np.average(
-                    [np.ones(subim.shape)*255,subim],
-                    axis=0,
-                    weights=[boxalpha,1-boxalpha]
-                )
-            exportim[int(y):int(y+boxheight), int(x):int(x+boxwidth)] = subim
-            exportim = Image.fromarray(exportim,'L')
+                boxcol = 255
+            
+            #blend box color with image through a lookup table of the 256 
+            #possible grey values, applied to only the box region by PIL
+            x0,y0 = int(x),int(y)
+            box = exportim.crop((x0,y0,int(x+boxwidth),int(y+boxheight)))
+            exportim.paste(box.point(_box_lut(boxalpha,boxcol)),(x0,y0))
             
         #make draw object if needed
         if draw_bar or draw_text:
@@ -394,13 +423,12 @@ def _export_with_scalebar(exportim,pixelsize,unit,filename,preprocess=None,
                 texcol = 0
 
         
-            #draw text
-            draw.text(
-                (textx,texty),
-                text,
-                fill=texcol,
-                font=font
-            )
+            #draw text by pasting the (cached) rendered text mask
+            x0,y0 = int(np.floor(textx)),int(np.floor(texty))
+            mask,(ox,oy) = _render_text(text,font,fontsize,
+                                        (textx-x0,texty-y0))
+            exportim.paste(texcol,(x0+ox,y0+oy,x0+ox+mask.size[0],
+                                   y0+oy+mask.size[1]),mask)
     
     #show result
     if show_figure:
@@ -413,11 +441,32 @@ def _export_with_scalebar(exportim,pixelsize,unit,filename,preprocess=None,
     
     #save image
     if save:
-        exportim.save(filename)
+        exportim.save(filename,compress_level=png_compress_level,
+                      optimize=optimize)
         print('Image saved as "'+filename+'"')
 
     return exportim
 
+#'nice' values for the default scale bar size, sorted for bisection
+_NICE_BARSIZES = (
+    0.01, 0.02, 0.025, 0.03, 0.04, 0.05, 0.1, 0.2, 0.25, 0.3, 0.4, 0.5,
+    1, 2, 3, 4, 5, 10, 20, 25, 30, 40, 50, 100, 200, 250, 300,
+    400, 500, 1000, 2000, 2500, 3000, 4000, 5000, 6000, 8000, 10000
+)
+
+def _nice_barsize(barsize):
+    """
+    rounds barsize to the nearest value in `_NICE_BARSIZES` (rounding down 
+    for ties), using bisection on the sorted values
+    """
+    i = bisect_left(_NICE_BARSIZES,barsize)
+    if i == 0:
+        return _NICE_BARSIZES[0]
+    if i == len(_NICE_BARSIZES):
+        return _NICE_BARSIZES[-1]
+    lower,upper = _NICE_BARSIZES[i-1],_NICE_BARSIZES[i]
+    return lower if barsize-lower <= upper-barsize else upper
+
 def _convert_length(value,unit,convert=None):
     """
     helper function to convert between units of length
@@ -443,35 +492,88 @@ def _convert_length(value,unit,convert=None):
         convert = 'µm'
     
     #convert aliases to correct characters
-    if convert == 'um':
-        convert = 'µm'
-    elif convert == 'A':
-        convert = 'Å'
-    
-    if unit == 'um':
-        unit = 'µm'
-    elif unit == 'A':
-        unit = 'Å'
+    convert = _UNIT_ALIASES.get(convert,convert)
+    unit = _UNIT_ALIASES.get(unit,unit)
     
     if convert != unit:
-        #list of all units in steps of 10
-        units = [
-            'fm', '', '',
-            'pm', '', 'Å',
-            'nm', '', '',
-            'µm', '', '',
-            'mm', 'cm', 'dm',
-            'm', 'dam', 'hm',
-            'km',
-        ]
         if unit=='' or convert=='':
             raise ValueError('unit and convert cannot be empty strings')
-        if not unit in units:
+        if not unit in _LENGTH_UNITS:
             raise ValueError('"'+str(unit)+'" is not a valid unit')
-        if not convert in units:
+        if not convert in _LENGTH_UNITS:
             raise ValueError('"'+str(convert)+'" is not a valid unit')
         
-        # ×10 for every step in list, use indices to calculate difference
-        value = value*10**(units.index(unit)-units.index(convert))
+        #multiply with precomputed factor for this combination of units
+        value = value*_LENGTH_FACTORS[unit,convert]
         
-    return value,convert
\ No newline at end of file
+    return value,convert
+
+@lru_cache(maxsize=1)
+def _tesseract_config():
+    """
+    returns the tesseract-OCR config string for reading the text of TIA scale
+    bars, which depends on the installed tesseract version. Raises 
+    FileNotFoundError when the tesseract executable is not found. Cached, as
+    getting the version spawns a tesseract subprocess (errors are not cached).
+    """
+    import pytesseract
+    
+    #switch error handling from a ValueError (we may also raise later in case 
+    #of text recognition problems) to one we can only raise here, so we can 
+    #give the correct warning
+    try:
+        tesseract_version = float(str(pytesseract.get_tesseract_version())[:3])
+    except ValueError:
+        raise FileNotFoundError
+    
+    #settings vary per version, so use tesseract_verion to use correct
+    if tesseract_version <= 4.0:
+        #oem 0 selects older version of tesseract which still takes the 
+        #char_whitelist param
+        #tessedit_char_whitelist takes list of characters it searches for (to 
+        #reduce reading errors)
+        #psm 7 is a mode that tells tesseract to assume a single line of text 
+        #in the image
+        return "--oem 0 -c tessedit_char_whitelist=0123456789pnuµm --psm 7"
+    else:
+        #since version 4.1 char whitelist is added back
+        return "-c tessedit_char_whitelist=0123456789pnuµm --psm 7"
+
+@lru_cache(maxsize=32)
+def _box_lut(boxalpha,boxcol):
+    """
+    lookup table for blending 8 bit grey values with the box color, cached as
+    it only depends on the (per batch constant) box settings
+    """
+    lut = np.arange(256)*(1-boxalpha) + boxcol*boxalpha
+    return lut.astype(np.uint8).tolist()
+
+@lru_cache(maxsize=32)
+def _get_font(font,fontsize):
+    """
+    loads a truetype font, cached to avoid parsing the font file for every
+    exported image
+    """
+    from PIL import ImageFont
+    return ImageFont.truetype(font,size=fontsize)
+
+@lru_cache(maxsize=128)
+def _render_text(text,font,fontsize,start=(0,0)):
+    """
+    rasterizes `text` in the given font and size to a mask image with text 
+    pixels drawn at subpixel offset `start`. Cached so that exporting many 
+    images with the same scale bar text only lays out and renders the glyphs
+    once. Returns the mask and the position of its top left corner relative to
+    the (integer) text position.
+    """
+    from PIL import Image,ImageDraw
+    font = _get_font(font,fontsize)
+    
+    #pad canvas so glyphs extending left of or above the origin fit
+    left,top,right,bottom = font.getbbox(text)
+    ox,oy = min(left,0)-1,min(top,0)-1
+    mask = Image.new('L',(right-ox+2,bottom-oy+2))
+    ImageDraw.Draw(mask,'L').text(
+        (start[0]-ox,start[1]-oy),text,fill=255,font=font)
+    
+    return mask,(ox,oy)